@@ -0,0 +1,32 @@
+import csv
+
+import pytest
+
+import history
+
+
+def make_session(index, n_samples=20, patient_name='teste', condition='Sem Corrente', joint='Cotovelo',
+                 current_value=None):
+    angles = [float(i + index) for i in range(n_samples)]
+    series = ', '.join(map(str, angles))
+    return [patient_name, f'2024-12-05 14:{index // 60:02d}:{index % 60:02d}', condition, joint,
+            current_value, series, series, series, series, series]
+
+
+@pytest.fixture
+def patient_history(tmp_path, monkeypatch):
+    """
+    Escreve um <paciente>_sessions.csv temporário (mesmo formato de save_patient_data)
+    e faz o history apontar para ele.
+    """
+    filename = tmp_path / 'teste_sessions.csv'
+    monkeypatch.setattr(history, 'history_file', lambda patient_name, data_dir=None: str(filename))
+
+    def write(sessions):
+        with open(filename, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(history.SESSION_COLUMNS)
+            writer.writerows(sessions)
+        return filename
+
+    return write
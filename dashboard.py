@@ -7,6 +7,13 @@ import os
 from datetime import datetime
 import csv
 import numpy as np
+from flask import abort, send_file
+
+from history import (HISTORY_CSV_OPTIONS, RAW_COLUMNS, SESSION_COLUMNS, history_file, load_session_series,
+                     page_session_summaries)
+from export import EXPORT_FORMATS, get_export_job, start_export_job
+from metrics import (apply_rules, calculate_angular_velocity, calculate_g7, load_rules, normalize_and_trim,
+                     rule_matches)
 
 # Inicializa o app
 app = dash.Dash(__name__)
@@ -15,6 +22,11 @@ app.config.suppress_callback_exceptions = True
 # Caminho para o arquivo CSV
 DATA_FILE = 'sensor_data.csv'
 
+# Tabela do histórico: colunas de resumo e sessões por página
+HISTORY_SUMMARY_COLUMNS = ['Session Time', 'Condition', 'Articulação', 'Valor Corrente',
+                           'Amostras', 'Ângulo Mínimo', 'Ângulo Máximo']
+HISTORY_PAGE_SIZE = 10
+
 def read_sensor_data():
     if os.path.exists(DATA_FILE):
         try:
@@ -58,18 +70,8 @@ def calculate_g7_metric_from_plotted_data(df_feedback, joint):
             # Obtém o máximo dos valores plotados para "Sem Corrente"
             max_without_current = max(max_without_current or 0, max(angles))
 
-    # Verifica se há dados suficientes para o cálculo
-    if max_with_current is None or max_without_current is None:
-        return "Erro: Dados insuficientes para calcular a Métrica G7."
-
-    # Verifica se o pico sem corrente é zero (evita divisão por zero)
-    if max_without_current == 0:
-        return "Erro: Pico máximo sem corrente é zero. Não é possível calcular a Métrica G7."
-
     # Calcula a Métrica G7
-    metric_g7 = ((max_with_current - max_without_current) / max_without_current) * 1
-
-    return metric_g7
+    return calculate_g7(max_with_current, max_without_current)
 
 
 
@@ -81,30 +83,16 @@ def calculate_g7_metric_from_plotted_data(df_feedback, joint):
 # Função para carregar o histórico do paciente e calcular métricas
 # Função para carregar o histórico do paciente e lidar com os valores salvos
 def load_patient_history(patient_name):
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    filename = os.path.join(BASE_DIR, f'{patient_name}_sessions.csv')
-
-    # Lista de colunas esperadas na ordem correta
-    expected_columns = ['Patient Name', 'Session Time', 'Condition', 'Articulação',
-                        'Valor Corrente', 'Pitch 1', 'Roll 1', 'Pitch 2', 'Roll 2', 'Angle Between Sensors']
+    filename = history_file(patient_name)
 
     if os.path.exists(filename):
         try:
             if os.stat(filename).st_size == 0:
                 print(f"Arquivo {filename} está vazio!")
-                return pd.DataFrame(columns=expected_columns)
+                return pd.DataFrame(columns=SESSION_COLUMNS)
 
             # Lê o arquivo ignorando o cabeçalho e atribui os nomes das colunas manualmente
-            df = pd.read_csv(
-                filename,
-                header=None,  # Ignora o cabeçalho do arquivo
-                names=expected_columns,  # Define os nomes das colunas manualmente
-                skiprows=1,
-                encoding='utf-8',
-                na_values=["", " "],
-                quotechar='"',
-                on_bad_lines='skip'
-            )
+            df = pd.read_csv(filename, **HISTORY_CSV_OPTIONS)
 
              # Converte listas para strings para colunas problemáticas
             if 'Angle Between Sensors' in df.columns:
@@ -120,18 +108,18 @@ def load_patient_history(patient_name):
 
         except Exception as e:
             print(f"Erro ao carregar o arquivo: {e}")
-            return pd.DataFrame(columns=expected_columns)
+            return pd.DataFrame(columns=SESSION_COLUMNS)
     print(f"Arquivo {filename} não encontrado!")
-    return pd.DataFrame(columns=expected_columns)
+    return pd.DataFrame(columns=SESSION_COLUMNS)
 
 
-def preprocess_angle_data(df_feedback):
-    # Aplica alterações específicas para certos pacientes, articulações e condições
+def preprocess_angle_data(df_feedback, rules=None):
+    # Aplica as correções de preprocess_rules.json para certos pacientes, articulações e condições
+    rules = rules or load_rules()
     for index, row in df_feedback.iterrows():
-        if row['Patient Name'] == 'Perso' and row['Articulação'] == 'Punho' and row['Condition'] == 'Corrente' and row['Valor Corrente'] == 23:
-            # Inverte o sinal e aplica o valor absoluto
+        if any(rule_matches(rule, row) for rule in rules['rules']):
             angles = list(map(float, row['Angle Between Sensors'].split(', ')))
-            adjusted_angles = [abs(x) for x in [-x for x in angles]]  # Inverte o sinal e usa o valor absoluto
+            adjusted_angles = apply_rules(row, angles, rules)
             df_feedback.at[index, 'Angle Between Sensors'] = ', '.join(map(str, adjusted_angles))
 
     return df_feedback
@@ -341,7 +329,8 @@ def toggle_analysis(n_clicks):
             # Apaga os dados do sensor_data.csv, mas mantém os cabeçalhos
             with open('sensor_data.csv', 'w', newline='') as file:
                 writer = csv.writer(file)
-                writer.writerow(['Timestamp', 'Pitch 1', 'Roll 1', 'Pitch 2', 'Roll 2', 'Angle Between Sensors'])
+                writer.writerow(['Timestamp', 'Pitch 1', 'Roll 1', 'Pitch 2', 'Roll 2', 'Angle Between Sensors',
+                                 'Raw Pitch 1', 'Raw Roll 1', 'Raw Pitch 2', 'Raw Roll 2'])
             return False, "Análise iniciada. Gráfico em tempo real ativo.", "Parar Análise"
         else:
             return True, "Análise pausada.", "Iniciar Análise"
@@ -379,16 +368,57 @@ def render_content(tab, n_intervals, patient_name):
         return html.Div([html.H3("Colunas 'Timestamp' ou 'Angle Between Sensors' não encontradas no sensor_data.csv.")])
 
     elif tab == 'tab-2':  # Histórico do Paciente
-        df_history = load_patient_history(patient_name)
-        if not df_history.empty:
+        # Não recria a tabela a cada intervalo (perderia a página e a seleção)
+        if dash.callback_context.triggered_id == 'interval-component':
+            return dash.no_update
+        if os.path.exists(history_file(patient_name)):
             return html.Div([
                 html.H3("Histórico de Sessões Recentes"),
+                # Apenas o resumo de cada sessão; as páginas são montadas no servidor
                 dash.dash_table.DataTable(
-                    data=df_history.to_dict('records'),
-                    columns=[{"name": i, "id": i} for i in df_history.columns],
+                    id='history-table',
+                    columns=[{"name": i, "id": i} for i in HISTORY_SUMMARY_COLUMNS],
+                    page_action='custom',
+                    page_current=0,
+                    page_size=HISTORY_PAGE_SIZE,
+                    sort_action='custom',
+                    sort_mode='multi',
+                    sort_by=[],
+                    filter_action='custom',
+                    filter_query='',
+                    row_selectable='multi',
+                    selected_row_ids=[],
                     style_table={'overflowX': 'auto'},
                     style_cell={'textAlign': 'left'}
-                )
+                ),
+                html.P("Clique em uma sessão para ver as séries completas.", style={'color': 'gray'}),
+                # Séries completas da sessão expandida (carregadas sob demanda)
+                html.Div(id='history-session-detail'),
+                html.Div(
+                    style={'display': 'flex', 'alignItems': 'center', 'gap': '10px', 'marginTop': '20px'},
+                    children=[
+                        html.Label("Exportar sessões:", style={'fontSize': '18px'}),
+                        dcc.Dropdown(
+                            id='export-format',
+                            options=[
+                                {'label': 'CSV', 'value': 'csv'},
+                                {'label': 'Excel', 'value': 'xlsx'},
+                                {'label': 'Parquet', 'value': 'parquet'}
+                            ],
+                            value='csv',
+                            clearable=False,
+                            style={'width': '150px'}
+                        ),
+                        html.Button('Exportar', id='export-button', n_clicks=0,
+                                    style={'padding': '10px 20px', 'backgroundColor': '#3498db', 'color': 'white',
+                                           'border': 'none', 'borderRadius': '5px'})
+                    ]
+                ),
+                html.P("Sem sessões selecionadas, todas as sessões do paciente são exportadas.",
+                       style={'color': 'gray'}),
+                dcc.Store(id='export-job-id'),
+                dcc.Interval(id='export-interval', interval=1000, n_intervals=0, disabled=True),
+                html.Div(id='export-status', style={'marginTop': '10px'})
             ])
         return html.Div([html.H3("Nenhuma sessão encontrada para o paciente.")])
 
@@ -422,6 +452,94 @@ def render_content(tab, n_intervals, patient_name):
 
 
 
+# Callback para paginar o histórico no servidor
+@app.callback(
+    [Output('history-table', 'data'),
+     Output('history-table', 'page_count')],
+    [Input('history-table', 'page_current'),
+     Input('history-table', 'page_size'),
+     Input('history-table', 'sort_by'),
+     Input('history-table', 'filter_query'),
+     # Recarrega a página atual depois de salvar uma sessão. 'save-output' só muda
+     # quando save_patient_data termina, então o arquivo já contém a nova sessão
+     Input('save-session', 'n_clicks'),
+     Input('save-output', 'children')],
+    [State('patient-name', 'value')]
+)
+def update_history_table(page_current, page_size, sort_by, filter_query, save_clicks, save_output, patient_name):
+    return page_session_summaries(patient_name, page_current or 0, page_size, sort_by, filter_query)
+
+
+# Callback para expandir uma sessão: só aqui as séries completas são enviadas
+@app.callback(
+    Output('history-session-detail', 'children'),
+    [Input('history-table', 'active_cell')],
+    [State('patient-name', 'value')]
+)
+def expand_history_session(active_cell, patient_name):
+    if not active_cell or active_cell.get('row_id') is None:
+        return ""
+
+    session_time = active_cell['row_id']
+    series = load_session_series(patient_name, session_time)
+    if series is None:
+        return html.P(f"Sessão {session_time} não encontrada.", style={'color': 'red'})
+
+    fig = go.Figure()
+    for name, values in series.items():
+        fig.add_trace(go.Scatter(x=list(range(len(values))), y=values, mode='lines', name=name))
+    fig.update_layout(
+        title=f"Sessão {session_time}",
+        xaxis_title="Amostra",
+        yaxis_title="Ângulo (°)"
+    )
+    return dcc.Graph(figure=fig)
+
+
+# Rota para baixar os arquivos exportados
+@app.server.route('/exports/<job_id>')
+def download_export(job_id):
+    job = get_export_job(job_id)
+    if job is None or job['status'] != 'done':
+        abort(404)
+    return send_file(job['path'], as_attachment=True, download_name=job['filename'])
+
+
+# Callback para iniciar a exportação em segundo plano
+@app.callback(
+    [Output('export-job-id', 'data'),
+     Output('export-interval', 'disabled')],
+    [Input('export-button', 'n_clicks')],
+    [State('export-format', 'value'),
+     State('history-table', 'selected_row_ids'),
+     State('patient-name', 'value')]
+)
+def start_export(n_clicks, export_format, selected_sessions, patient_name):
+    if n_clicks > 0 and export_format in EXPORT_FORMATS:
+        job_id = start_export_job([patient_name], export_format, selected_sessions or None)
+        return job_id, False
+    return None, True
+
+
+# Callback para acompanhar a exportação e exibir o link de download
+@app.callback(
+    [Output('export-status', 'children'),
+     Output('export-interval', 'disabled', allow_duplicate=True)],
+    [Input('export-interval', 'n_intervals')],
+    [State('export-job-id', 'data')],
+    prevent_initial_call=True
+)
+def update_export_status(n_intervals, job_id):
+    job = get_export_job(job_id) if job_id else None
+    if job is None:
+        return "", True
+    if job['status'] == 'done':
+        return html.A(f"Baixar {job['filename']}", href=f"/exports/{job_id}"), True
+    if job['status'] == 'error':
+        return html.P(f"Erro na exportação: {job['error']}", style={'color': 'red'}), True
+    return "Exportando sessões...", False
+
+
 # Callback para salvar os dados do paciente
 @app.callback(
     Output('save-output', 'children'),
@@ -448,6 +566,9 @@ def save_patient_data(n_clicks, patient_name, condition_n_clicks, current_value,
         roll2_values = ", ".join(map(str, df['Roll 2'].tolist())) if 'Roll 2' in df.columns else ""
         angle_values = ", ".join(map(str, df['Angle Between Sensors'].tolist())) if 'Angle Between Sensors' in df.columns else ""
 
+        # Medições sem filtro (vazias se o sensor_data.csv for de uma versão anterior)
+        raw_values = [", ".join(map(str, df[col].tolist())) if col in df.columns else "" for col in RAW_COLUMNS]
+
         # Verifica se o arquivo já existe
         file_exists = os.path.exists(filename)
 
@@ -466,7 +587,8 @@ def save_patient_data(n_clicks, patient_name, condition_n_clicks, current_value,
                     'Roll 1',
                     'Pitch 2',
                     'Roll 2',
-                    'Angle Between Sensors'
+                    'Angle Between Sensors',
+                    *RAW_COLUMNS  # Pitch/Roll antes do filtro de Kalman
                 ])
 
             # Salva apenas uma linha com todos os valores detalhados
@@ -480,7 +602,8 @@ def save_patient_data(n_clicks, patient_name, condition_n_clicks, current_value,
                 roll1_values,  # Todos os valores de Roll 1
                 pitch2_values,  # Todos os valores de Pitch 2
                 roll2_values,  # Todos os valores de Roll 2
-                angle_values  # Todos os valores de Ângulo entre Sensores
+                angle_values,  # Todos os valores de Ângulo entre Sensores
+                *raw_values  # Pitch/Roll sem filtro
             ])
 
         return f"Dados da sessão do paciente '{patient_name}' salvos com sucesso!"
@@ -500,7 +623,8 @@ def update_feedback_graph(selected_joint, selected_test, patient_name):
         return html.Div([html.H3("Nenhum dado de feedback disponível para o paciente.")])
 
 
-    df_feedback = preprocess_angle_data(df_feedback)
+    rules = load_rules()
+    df_feedback = preprocess_angle_data(df_feedback, rules)
      # Filtra os dados pela articulação selecionada
     df_feedback = df_feedback[df_feedback['Articulação'] == selected_joint]
     if df_feedback.empty:
@@ -511,23 +635,10 @@ def update_feedback_graph(selected_joint, selected_test, patient_name):
         lambda x: list(map(float, x.split(', '))) if isinstance(x, str) else x
     )
 
-    # Normalizar e ajustar os dados
-    def normalize_and_trim(data):
-        # Converte para uma curva crescente, se necessário
-        if data[0] > data[-1]:  # Se for decrescente
-            data = [-x for x in data]  # Inverte os sinais
-
-        # Ajusta para partir do mesmo ponto
-        start_point = data[0]
-        normalized_data = [x - start_point for x in data]
-
-        # Encontra o ponto inicial e final relevantes
-        start_idx = max(0, next((i for i, val in enumerate(normalized_data) if abs(val) > 1), 0) - 10)
-        end_idx = min(len(normalized_data), start_idx + 50)  # Limita o tamanho a 50 pontos após o início
-        return normalized_data[start_idx:end_idx]
-
     # Aplica o ajuste a cada sessão
-    df_feedback['Trimmed Angle'] = df_feedback['Angle Between Sensors'].apply(normalize_and_trim)
+    df_feedback['Trimmed Angle'] = df_feedback['Angle Between Sensors'].apply(
+        lambda data: normalize_and_trim(data, **rules['trim'])
+    )
 
     # Criar o gráfico
     if selected_test == 'angle_time':
@@ -547,19 +658,6 @@ def update_feedback_graph(selected_joint, selected_test, patient_name):
         return dcc.Graph(figure=fig)
 
     if selected_test == 'speed_time':
-    # Calcula velocidade angular positiva
-        def calculate_angular_velocity(angles, times):
-            angular_velocity = []
-            for i in range(1, len(angles)):
-                delta_theta = angles[i] - angles[i - 1]  # Diferença de ângulo
-                delta_time = times[i] - times[i - 1]  # Diferença de tempo
-                if delta_time != 0:
-                    velocity = abs(delta_theta / delta_time)  # Usa o valor absoluto
-                    angular_velocity.append(velocity)
-                else:
-                    angular_velocity.append(0)  # Evita divisão por zero
-            return angular_velocity
-
         fig = go.Figure()
 
         for _, row in df_feedback.iterrows():
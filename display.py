@@ -1,11 +1,11 @@
 import socket
 import math
-from filterpy.kalman import KalmanFilter
 import numpy as np
 import pandas as pd
-from openpyxl import Workbook
 import os
 
+from kalman import AngleKalmanFilter, load_params
+
 # Substitua pelo IP exibido no Serial Monitor do ESP32
 esp32_ip = "172.20.10.7"
 esp32_port = 12345
@@ -13,7 +13,8 @@ esp32_port = 12345
 csv_file = "sensor_data.csv"
 
 # Inicializar DataFrame para salvar os dados
-columns = ["Timestamp", "Pitch 1", "Roll 1", "Pitch 2", "Roll 2", "Angle Between Sensors"]
+columns = ["Timestamp", "Pitch 1", "Roll 1", "Pitch 2", "Roll 2", "Angle Between Sensors",
+           "Raw Pitch 1", "Raw Roll 1", "Raw Pitch 2", "Raw Roll 2"]
 
 
 # Criação inicial do arquivo Excel
@@ -66,15 +67,9 @@ def calculate_angle_between(pitch1, roll1, pitch2, roll2):
 def init_kalman():
     """
     Configura um filtro de Kalman para suavizar os ângulos.
+    Usa os ruídos ajustados em kalman_params.json, se existir (ver kalman.py).
     """
-    kf = KalmanFilter(dim_x=2, dim_z=2)  # Dois estados (pitch, roll), duas observações
-    kf.x = np.array([0, 0])  # Estado inicial (pitch, roll)
-    kf.F = np.eye(2)  # Matriz de transição
-    kf.H = np.eye(2)  # Matriz de observação
-    kf.P *= 10  # Covariância inicial
-    kf.R = np.eye(2) * 0.1  # Ruído de medição
-    kf.Q = np.eye(2) * 0.01  # Ruído do processo
-    return kf
+    return AngleKalmanFilter(**load_params())
 
 try:
     print("Tentando conectar ao ESP32...")
@@ -101,11 +96,11 @@ try:
                 # Aplica o filtro de Kalman
                 kalman_sensor1.predict()
                 kalman_sensor1.update([pitch1, roll1])
-                filtered_pitch1, filtered_roll1 = kalman_sensor1.x
+                filtered_pitch1, filtered_roll1 = kalman_sensor1.x[:2]
 
                 kalman_sensor2.predict()
                 kalman_sensor2.update([pitch2, roll2])
-                filtered_pitch2, filtered_roll2 = kalman_sensor2.x
+                filtered_pitch2, filtered_roll2 = kalman_sensor2.x[:2]
 
                 # Calcula o ângulo entre os sensores
                 angle_between_sensors = calculate_angle_between(
@@ -124,6 +119,11 @@ try:
                     "Pitch 2": filtered_pitch2,
                     "Roll 2": filtered_roll2,
                     "Angle Between Sensors": angle_between_sensors,
+                    # Medições antes do filtro (usadas para ajustar o filtro em kalman.py)
+                    "Raw Pitch 1": pitch1,
+                    "Raw Roll 1": roll1,
+                    "Raw Pitch 2": pitch2,
+                    "Raw Roll 2": roll2,
                 }
                 pd.DataFrame([new_data]).to_csv(csv_file, mode="a", header=False, index=False)
 
@@ -0,0 +1,191 @@
+import csv
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from openpyxl import Workbook
+
+from history import BASE_DIR, META_COLUMNS, SERIES_COLUMNS, iter_sessions, iter_samples
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet é opcional
+    pa = None
+    pq = None
+
+EXPORT_DIR = os.path.join(BASE_DIR, 'exports')
+
+# Formato longo: uma amostra por linha
+EXPORT_COLUMNS = META_COLUMNS + ['Sample'] + SERIES_COLUMNS
+
+EXPORT_FORMATS = {'csv': '.csv', 'xlsx': '.xlsx', 'parquet': '.parquet'}
+
+# Quantidade de linhas acumuladas antes de gravar um bloco no Parquet
+PARQUET_BATCH_SIZE = 10000
+
+# Limite de linhas de uma planilha do Excel (inclui o cabeçalho)
+EXCEL_MAX_ROWS = 1048576
+
+# Tempo (s) que um arquivo exportado fica disponível antes de ser apagado
+EXPORT_TTL = 3600
+
+# Jobs de exportação em segundo plano: job_id -> status
+export_jobs = {}
+export_jobs_lock = threading.Lock()
+
+
+def iter_export_rows(patient_names, session_times=None):
+    """
+    Gera as linhas de exportação de todos os pacientes, uma sessão por vez.
+    """
+    for patient_name in patient_names:
+        for session in iter_sessions(patient_name, session_times):
+            yield from iter_samples(session)
+
+
+def write_csv(path, rows):
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(EXPORT_COLUMNS)
+        writer.writerows(rows)
+
+
+def write_excel(path, rows):
+    # Modo write-only: as linhas vão direto para o arquivo, sem ficar na memória
+    wb = Workbook(write_only=True)
+    ws = None
+    sheet_rows = EXCEL_MAX_ROWS
+    for row in rows:
+        if sheet_rows >= EXCEL_MAX_ROWS:
+            # Abre uma nova planilha quando a atual chega ao limite do Excel
+            ws = wb.create_sheet(f"Sessões {len(wb.worksheets) + 1}")
+            ws.append(EXPORT_COLUMNS)
+            sheet_rows = 1
+        ws.append(row)
+        sheet_rows += 1
+    if ws is None:
+        wb.create_sheet("Sessões 1").append(EXPORT_COLUMNS)
+    wb.save(path)
+
+
+def write_parquet(path, rows):
+    if pq is None:
+        raise RuntimeError("Exportação em Parquet requer o pacote 'pyarrow'.")
+
+    schema = pa.schema(
+        [(col, pa.string()) for col in META_COLUMNS[:-1]]
+        + [('Valor Corrente', pa.float64()), ('Sample', pa.int64())]
+        + [(col, pa.float64()) for col in SERIES_COLUMNS]
+    )
+
+    def write_batch(writer, batch):
+        columns = list(zip(*batch))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema
+        ))
+
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= PARQUET_BATCH_SIZE:
+                write_batch(writer, batch)
+                batch = []
+        if batch:
+            write_batch(writer, batch)
+
+
+EXPORT_WRITERS = {'csv': write_csv, 'xlsx': write_excel, 'parquet': write_parquet}
+
+
+def export_sessions(patient_names, export_format, path, session_times=None):
+    """
+    Exporta as sessões selecionadas em formato longo, gravando em streaming.
+    """
+    if export_format not in EXPORT_WRITERS:
+        raise ValueError(f"Formato de exportação desconhecido: {export_format}")
+    EXPORT_WRITERS[export_format](path, iter_export_rows(patient_names, session_times))
+    return path
+
+
+def _run_export_job(job_id, patient_names, export_format, session_times):
+    with export_jobs_lock:
+        path = export_jobs[job_id]['path']
+        export_jobs[job_id]['status'] = 'running'
+    try:
+        export_sessions(patient_names, export_format, path, session_times)
+        status, error = 'done', None
+    except Exception as e:
+        print(f"Erro na exportação {job_id}: {e}")
+        status, error = 'error', str(e)
+    with export_jobs_lock:
+        export_jobs[job_id]['status'] = status
+        export_jobs[job_id]['error'] = error
+        export_jobs[job_id]['finished'] = time.time()
+
+
+def cleanup_export_jobs(ttl=EXPORT_TTL):
+    """
+    Remove os jobs que terminaram há mais de ttl segundos e seus arquivos, além de
+    arquivos antigos de exportações anteriores (ex.: antes de reiniciar o servidor).
+    """
+    expires = time.time() - ttl
+    with export_jobs_lock:
+        expired = [job_id for job_id, job in export_jobs.items()
+                   if job['finished'] is not None and job['finished'] < expires]
+        expired_paths = [export_jobs.pop(job_id)['path'] for job_id in expired]
+        known_paths = {job['path'] for job in export_jobs.values()}
+
+    if os.path.isdir(EXPORT_DIR):
+        # Arquivos sem job (ex.: de antes de reiniciar o servidor) expiram pela data
+        expired_paths += [
+            path for path in (os.path.join(EXPORT_DIR, name) for name in os.listdir(EXPORT_DIR))
+            if path not in known_paths and os.path.getmtime(path) < expires
+        ]
+
+    for path in expired_paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Erro ao apagar a exportação {path}: {e}")
+
+
+def start_export_job(patient_names, export_format, session_times=None):
+    """
+    Inicia a exportação em uma thread separada e retorna o id do job.
+    """
+    if export_format not in EXPORT_WRITERS:
+        raise ValueError(f"Formato de exportação desconhecido: {export_format}")
+
+    cleanup_export_jobs()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    job_id = uuid.uuid4().hex
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"{'_'.join(patient_names)}_{stamp}{EXPORT_FORMATS[export_format]}"
+    with export_jobs_lock:
+        export_jobs[job_id] = {
+            'status': 'pending',
+            'path': os.path.join(EXPORT_DIR, f"{job_id}_{filename}"),
+            'filename': filename,
+            'error': None,
+            'finished': None
+        }
+
+    threading.Thread(
+        target=_run_export_job,
+        args=(job_id, list(patient_names), export_format, session_times),
+        daemon=True
+    ).start()
+    return job_id
+
+
+def get_export_job(job_id):
+    with export_jobs_lock:
+        job = export_jobs.get(job_id)
+        return dict(job) if job else None
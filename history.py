@@ -0,0 +1,285 @@
+import glob
+import io
+import os
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Pitch/Roll antes do filtro de Kalman. Sessões antigas não têm essas colunas
+# (o pandas preenche com NaN as linhas com menos campos)
+RAW_COLUMNS = ['Raw Pitch 1', 'Raw Roll 1', 'Raw Pitch 2', 'Raw Roll 2']
+
+# Lista de colunas esperadas na ordem correta
+SESSION_COLUMNS = ['Patient Name', 'Session Time', 'Condition', 'Articulação',
+                   'Valor Corrente', 'Pitch 1', 'Roll 1', 'Pitch 2', 'Roll 2', 'Angle Between Sensors'] + RAW_COLUMNS
+
+# Colunas que guardam a série completa de amostras (floats separados por ", ")
+SERIES_COLUMNS = ['Pitch 1', 'Roll 1', 'Pitch 2', 'Roll 2', 'Angle Between Sensors']
+META_COLUMNS = ['Patient Name', 'Session Time', 'Condition', 'Articulação', 'Valor Corrente']
+
+# Opções de leitura compartilhadas pelo dashboard e pela exportação
+HISTORY_CSV_OPTIONS = {
+    'header': None,  # Ignora o cabeçalho do arquivo
+    'names': SESSION_COLUMNS,  # Define os nomes das colunas manualmente
+    'skiprows': 1,
+    'encoding': 'utf-8',
+    'na_values': ["", " "],
+    'quotechar': '"',
+    'on_bad_lines': 'skip'
+}
+
+HISTORY_SUFFIX = '_sessions.csv'
+
+# Número de sessões lidas por vez do CSV (mantém a memória constante)
+CHUNK_SIZE = 50
+
+
+def history_file(patient_name, data_dir=BASE_DIR):
+    return os.path.join(data_dir, f'{patient_name}{HISTORY_SUFFIX}')
+
+
+def list_history_files(data_dir=BASE_DIR):
+    """
+    Lista os arquivos de sessões de todos os pacientes: (paciente, caminho).
+    """
+    return sorted(
+        (os.path.basename(path)[:-len(HISTORY_SUFFIX)], path)
+        for path in glob.glob(os.path.join(data_dir, f'*{HISTORY_SUFFIX}'))
+    )
+
+
+def parse_series(value):
+    """
+    Converte a string de floats salva no CSV em uma lista de floats.
+    """
+    if isinstance(value, str) and value.strip():
+        return [float(x) for x in value.split(',')]
+    if isinstance(value, list):
+        return value
+    return []
+
+
+def iter_sessions(patient_name, session_times=None, chunksize=CHUNK_SIZE):
+    """
+    Percorre as sessões salvas de um paciente sem carregar o arquivo inteiro.
+    Retorna um dicionário por sessão, com as séries ainda como strings.
+    """
+    yield from iter_session_file(history_file(patient_name), session_times, chunksize)
+
+
+def iter_session_file(filename, session_times=None, chunksize=CHUNK_SIZE):
+    """
+    Mesmo que iter_sessions, mas a partir do caminho do arquivo de sessões.
+    """
+    if not os.path.exists(filename) or os.stat(filename).st_size == 0:
+        return
+
+    wanted = set(session_times) if session_times else None
+    for chunk in pd.read_csv(filename, chunksize=chunksize, **HISTORY_CSV_OPTIONS):
+        if wanted is not None:
+            chunk = chunk[chunk['Session Time'].isin(wanted)]
+        for session in chunk.to_dict('records'):
+            yield session
+
+
+def split_session_file(filename, chunk_bytes):
+    """
+    Divide o arquivo de sessões em intervalos de bytes [início, fim) de até
+    chunk_bytes, para que cada intervalo seja lido por um processo diferente.
+    """
+    size = os.path.getsize(filename)
+    return [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+
+
+def iter_session_range(filename, start, end, chunksize=CHUNK_SIZE):
+    """
+    Percorre as sessões cuja linha começa dentro de [start, end) do arquivo.
+    Cada sessão ocupa uma única linha do CSV, então intervalos vizinhos
+    (de split_session_file) cobrem todas as sessões exatamente uma vez.
+    """
+    with open(filename, 'rb') as file:
+        if start == 0:
+            file.readline()  # Cabeçalho
+        else:
+            # Volta um byte para saber se start já é o início de uma linha
+            file.seek(start - 1)
+            file.readline()
+
+        lines = []
+        while file.tell() < end:
+            line = file.readline()
+            if not line:
+                break
+            lines.append(line)
+            if len(lines) >= chunksize:
+                yield from _parse_session_lines(lines)
+                lines = []
+        if lines:
+            yield from _parse_session_lines(lines)
+
+
+def _parse_session_lines(lines):
+    try:
+        df = pd.read_csv(io.BytesIO(b''.join(lines)), **dict(HISTORY_CSV_OPTIONS, skiprows=0))
+    except pd.errors.EmptyDataError:  # Só linhas em branco
+        return []
+    return df.to_dict('records')
+
+
+def to_text(value):
+    return None if pd.isna(value) else str(value)
+
+
+def to_float(value):
+    # Valores que não são números (ex.: texto digitado por engano) viram vazio
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if pd.isna(value) else value
+
+
+def iter_samples(session):
+    """
+    Converte uma sessão em linhas no formato longo (uma amostra por linha).
+    """
+    # Tipos fixos por coluna: o pandas pode inferir outro tipo (ex.: nome numérico)
+    meta = [to_text(session[col]) for col in META_COLUMNS[:-1]] + [to_float(session['Valor Corrente'])]
+    series = [parse_series(session[col]) for col in SERIES_COLUMNS]
+    n_samples = max(len(values) for values in series)
+    for i in range(n_samples):
+        yield meta + [i] + [values[i] if i < len(values) else None for values in series]
+
+
+def summarize_session(session):
+    """
+    Resume uma sessão sem as séries completas (usado na tabela do histórico).
+    """
+    angles = parse_series(session['Angle Between Sensors'])
+    # Mesmos tipos de iter_samples: valores ausentes viram None (vão para o fim na ordenação)
+    return {
+        'id': to_text(session['Session Time']),
+        'Session Time': to_text(session['Session Time']),
+        'Condition': to_text(session['Condition']),
+        'Articulação': to_text(session['Articulação']),
+        'Valor Corrente': to_float(session['Valor Corrente']),
+        'Amostras': len(angles),
+        'Ângulo Mínimo': round(min(angles), 2) if angles else None,
+        'Ângulo Máximo': round(max(angles), 2) if angles else None,
+    }
+
+
+# Cache dos resumos por arquivo: filename -> (mtime, tamanho, resumos)
+_summary_cache = {}
+
+# Operadores aceitos no filtro da tabela (sintaxe do filter_query do DataTable)
+FILTER_OPERATORS = [['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'],
+                    ['ne ', '!='], ['eq ', '='], ['contains '], ['datestartswith ']]
+
+
+def load_session_summaries(patient_name):
+    """
+    Resume todas as sessões do paciente, relendo o arquivo só quando ele muda.
+    """
+    filename = history_file(patient_name)
+    if not os.path.exists(filename):
+        return []
+
+    stat = os.stat(filename)
+    cached = _summary_cache.get(filename)
+    if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+        return cached[2]
+
+    summaries = [summarize_session(session) for session in iter_sessions(patient_name)]
+    _summary_cache[filename] = (stat.st_mtime, stat.st_size, summaries)
+    return summaries
+
+
+def split_filter_part(filter_part):
+    """
+    Separa uma expressão do filtro do DataTable em (coluna, operador, valor).
+    """
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+                value_part = value_part.strip()
+                if value_part and value_part[0] == value_part[-1] and value_part[0] in ("'", '"', '`'):
+                    value = value_part[1:-1].replace('\\' + value_part[0], value_part[0])
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                # O operador é retornado sempre na forma por extenso (ex.: 'eq')
+                return name, operator_type[0].strip(), value
+    return None, None, None
+
+
+def _matches(summary, name, operator, value):
+    field = summary.get(name)
+    if field is None:
+        return False
+    if operator in ('contains', 'datestartswith'):
+        field = str(field)
+        return field.startswith(value_to_text(value)) if operator == 'datestartswith' else value_to_text(value) in field
+    # Compara como número quando os dois lados são numéricos; senão, como texto
+    if not (isinstance(field, (int, float)) and isinstance(value, (int, float))):
+        field, value = str(field), value_to_text(value)
+    return {
+        'eq': field == value, 'ne': field != value,
+        'lt': field < value, 'le': field <= value,
+        'gt': field > value, 'ge': field >= value,
+    }[operator]
+
+
+def value_to_text(value):
+    # '23.0' digitado como 23 no filtro deve casar com o texto '23'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def filter_summaries(summaries, filter_query):
+    for filter_part in (filter_query or '').split(' && '):
+        name, operator, value = split_filter_part(filter_part)
+        if name is None:
+            continue
+        summaries = [summary for summary in summaries if _matches(summary, name, operator, value)]
+    return summaries
+
+
+def sort_summaries(summaries, sort_by):
+    # Aplica as ordenações da última para a primeira (ordenação estável)
+    for sort in reversed(sort_by or []):
+        column = sort['column_id']
+        present = [s for s in summaries if s.get(column) is not None]
+        missing = [s for s in summaries if s.get(column) is None]
+        present.sort(key=lambda s: s[column], reverse=sort['direction'] == 'desc')
+        summaries = present + missing
+    return summaries
+
+
+def page_session_summaries(patient_name, page_current, page_size, sort_by=None, filter_query=''):
+    """
+    Retorna apenas a página pedida da tabela de histórico e o total de páginas.
+    Filtro e ordenação são aplicados no servidor, antes da paginação.
+    """
+    summaries = filter_summaries(load_session_summaries(patient_name), filter_query)
+    summaries = sort_summaries(summaries, sort_by)
+    page_count = max(1, -(-len(summaries) // page_size))
+    start = page_current * page_size
+    return summaries[start:start + page_size], page_count
+
+
+def load_session_series(patient_name, session_time):
+    """
+    Carrega as séries completas de uma única sessão (usado ao expandir uma linha).
+    """
+    for session in iter_sessions(patient_name, [session_time]):
+        return {col: parse_series(session[col]) for col in SERIES_COLUMNS}
+    return None
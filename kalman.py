@@ -0,0 +1,343 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from history import BASE_DIR, RAW_COLUMNS, iter_sessions, parse_series
+
+# Arquivo com os ruídos ajustados a partir das sessões gravadas
+PARAMS_FILE = os.path.join(BASE_DIR, 'kalman_params.json')
+
+# Parâmetros padrão do filtro (ângulos em graus, tempo em amostras)
+DEFAULT_PARAMS = {
+    'dt': 1.0,  # Intervalo entre amostras
+    'process_noise': 1.0,  # Densidade do ruído de aceleração angular (Q)
+    'measurement_noise': 0.1,  # Variância da medição de pitch/roll (R)
+    'initial_covariance': 10.0,  # Covariância inicial (P)
+    'adaptive': False,  # Estima R online a partir das inovações
+    'forgetting_factor': 0.98  # Memória da estimativa adaptativa de R
+}
+
+# Grade (log) usada no ajuste por máxima verossimilhança
+TUNING_GRID = np.logspace(-3, 2, 21)
+
+# Máximo de séries filtradas de uma vez durante o ajuste
+TUNING_BATCH_SIZE = 20000
+
+
+def wrap_angle(angle):
+    """
+    Leva ângulos para o intervalo [-180, 180), tratando a passagem por ±180°.
+    """
+    return (np.asarray(angle) + 180.0) % 360.0 - 180.0
+
+
+def transition_matrix(dt):
+    """
+    Modelo de velocidade constante: estado [pitch, roll, vel. pitch, vel. roll].
+    """
+    F = np.eye(4)
+    F[0, 2] = F[1, 3] = dt
+    return F
+
+
+def process_noise_matrix(dt):
+    """
+    Matriz Q por unidade de ruído (aceleração branca discretizada).
+    """
+    Q = np.zeros((4, 4))
+    for pos, vel in ((0, 2), (1, 3)):
+        Q[pos, pos] = dt ** 4 / 4
+        Q[pos, vel] = Q[vel, pos] = dt ** 3 / 2
+        Q[vel, vel] = dt ** 2
+    return Q
+
+
+def load_params(filename=PARAMS_FILE):
+    """
+    Lê os parâmetros ajustados, completando com os valores padrão.
+    """
+    params = dict(DEFAULT_PARAMS)
+    if os.path.exists(filename):
+        try:
+            with open(filename, encoding='utf-8') as file:
+                params.update(json.load(file))
+        except (OSError, ValueError) as e:
+            print(f"Erro ao ler os parâmetros do filtro: {e}")
+    return params
+
+
+def save_params(params, filename=PARAMS_FILE):
+    with open(filename, 'w', encoding='utf-8') as file:
+        json.dump(params, file, indent=4)
+
+
+class AngleKalmanFilter:
+    """
+    Filtro de Kalman para (pitch, roll) de um sensor, amostra a amostra.
+    A inovação é calculada com o ângulo "enrolado", então a passagem de
+    +180° para -180° não aparece como um salto de 360°.
+    """
+
+    def __init__(self, dt=DEFAULT_PARAMS['dt'], process_noise=DEFAULT_PARAMS['process_noise'],
+                 measurement_noise=DEFAULT_PARAMS['measurement_noise'],
+                 initial_covariance=DEFAULT_PARAMS['initial_covariance'],
+                 adaptive=DEFAULT_PARAMS['adaptive'], forgetting_factor=DEFAULT_PARAMS['forgetting_factor']):
+        self.F = transition_matrix(dt)
+        self.Q = process_noise_matrix(dt) * process_noise
+        self.H = np.eye(2, 4)
+        self.R = np.eye(2) * measurement_noise
+        self.P = np.eye(4) * initial_covariance
+        self.x = np.zeros(4)
+        self.y = np.zeros(2)  # Última inovação (medição - predição), em graus
+        self.initial_covariance = initial_covariance
+        self.adaptive = adaptive
+        self.forgetting_factor = forgetting_factor
+        self.n_updates = 0
+
+    def predict(self):
+        self.x = self.F @ self.x
+        self.x[:2] = wrap_angle(self.x[:2])
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+    def update(self, z):
+        z = np.asarray(z, dtype=float)
+        if self.n_updates == 0:
+            # A primeira medição inicializa o estado (evita partir de 0°)
+            self.x[:2] = wrap_angle(z)
+            self.P = np.eye(4) * self.initial_covariance
+            self.n_updates = 1
+            return
+
+        self.y = y = wrap_angle(z - self.H @ self.x)
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.x[:2] = wrap_angle(self.x[:2])
+        self.P = (np.eye(4) - K @ self.H) @ self.P
+
+        if self.adaptive:
+            # Estimativa de Sage-Husa para R (pelo resíduo), com fator de esquecimento
+            b = self.forgetting_factor
+            d = (1 - b) / (1 - b ** (self.n_updates + 1))
+            residual = wrap_angle(z - self.H @ self.x)
+            self.R = (1 - d) * self.R + d * (np.outer(residual, residual) + self.H @ self.P @ self.H.T)
+        self.n_updates += 1
+
+
+def filter_batch(measurements, process_noise, measurement_noise,
+                 dt=DEFAULT_PARAMS['dt'], initial_covariance=DEFAULT_PARAMS['initial_covariance'],
+                 adaptive=DEFAULT_PARAMS['adaptive'], forgetting_factor=DEFAULT_PARAMS['forgetting_factor']):
+    """
+    Filtra várias séries ao mesmo tempo, vetorizado entre as séries.
+
+    measurements: array (n_series, n_amostras, 2) com (pitch, roll); séries
+    mais curtas são completadas com NaN no final.
+    process_noise / measurement_noise: escalar ou array (n_series,).
+    adaptive / forgetting_factor: mesma estimativa de R de AngleKalmanFilter.
+
+    Retorna os ângulos filtrados (mesmo formato, NaN nas posições vazias) e
+    o log da verossimilhança de cada série.
+    """
+    z = np.asarray(measurements, dtype=float)
+    n_series, n_steps, _ = z.shape
+    if n_steps == 0:
+        # Todas as séries estão vazias: nada para filtrar
+        return np.full(z.shape, np.nan), np.zeros(n_series)
+    q = np.broadcast_to(np.asarray(process_noise, dtype=float), (n_series,))
+    r = np.broadcast_to(np.asarray(measurement_noise, dtype=float), (n_series,))
+
+    F = transition_matrix(dt)
+    Q = q[:, None, None] * process_noise_matrix(dt)
+    R = r[:, None, None] * np.eye(2)
+
+    x = np.zeros((n_series, 4))
+    x[:, :2] = wrap_angle(np.nan_to_num(z[:, 0]))
+    P = np.broadcast_to(np.eye(4) * initial_covariance, (n_series, 4, 4)).copy()
+
+    filtered = np.full(z.shape, np.nan)
+    filtered[:, 0] = np.where(np.isnan(z[:, 0]), np.nan, x[:, :2])
+    loglik = np.zeros(n_series)
+    n_updates = (~np.isnan(z[:, 0]).any(axis=1)).astype(float)  # A 1ª amostra só inicializa o estado
+
+    for t in range(1, n_steps):
+        # Predição
+        x = x @ F.T
+        x[:, :2] = wrap_angle(x[:, :2])
+        P = F @ P @ F.T + Q
+
+        # Atualização (somente nas séries que têm amostra neste instante)
+        valid = ~np.isnan(z[:, t]).any(axis=1)
+        y = wrap_angle(np.nan_to_num(z[:, t]) - x[:, :2])
+        S = P[:, :2, :2] + R
+        S_inv = np.linalg.inv(S)
+        K = P[:, :, :2] @ S_inv
+
+        x_new = x + np.einsum('bij,bj->bi', K, y)
+        x_new[:, :2] = wrap_angle(x_new[:, :2])
+        P_new = P - K @ P[:, :2, :]
+
+        x = np.where(valid[:, None], x_new, x)
+        P = np.where(valid[:, None, None], P_new, P)
+
+        if adaptive:
+            # Estimativa de Sage-Husa para R (pelo resíduo), série a série
+            b = forgetting_factor
+            d = (1 - b) / (1 - b ** (n_updates + 1))
+            residual = wrap_angle(np.nan_to_num(z[:, t]) - x[:, :2])
+            R_new = ((1 - d)[:, None, None] * R
+                     + d[:, None, None] * (np.einsum('bi,bj->bij', residual, residual) + P[:, :2, :2]))
+            R = np.where(valid[:, None, None], R_new, R)
+        n_updates += valid
+
+        mahalanobis = np.einsum('bi,bij,bj->b', y, S_inv, y)
+        _, logdet = np.linalg.slogdet(S)
+        loglik += np.where(valid, -0.5 * (mahalanobis + logdet + 2 * np.log(2 * np.pi)), 0.0)
+
+        filtered[:, t] = np.where(valid[:, None], x[:, :2], np.nan)
+
+    return filtered, loglik
+
+
+def tune_noise(measurements, grid=TUNING_GRID, per_session=False,
+               dt=DEFAULT_PARAMS['dt'], initial_covariance=DEFAULT_PARAMS['initial_covariance']):
+    """
+    Ajusta Q e R por máxima verossimilhança em uma grade, avaliando todas as
+    combinações e todas as séries de forma vetorizada.
+
+    Com per_session=True, retorna os ruídos ótimos de cada série; senão,
+    os ruídos que maximizam a verossimilhança somada de todas as séries.
+    """
+    z = np.asarray(measurements, dtype=float)
+    n_series = z.shape[0]
+    q_grid, r_grid = np.meshgrid(grid, grid, indexing='ij')
+    q_grid, r_grid = q_grid.ravel(), r_grid.ravel()
+    n_grid = q_grid.size
+
+    # Repete as séries para cada ponto da grade, em blocos para limitar a memória
+    points_per_pass = max(1, TUNING_BATCH_SIZE // max(n_series, 1))
+    loglik = np.empty((n_grid, n_series))
+    for start in range(0, n_grid, points_per_pass):
+        stop = min(start + points_per_pass, n_grid)
+        _, block = filter_batch(
+            np.tile(z, (stop - start, 1, 1)),
+            np.repeat(q_grid[start:stop], n_series),
+            np.repeat(r_grid[start:stop], n_series),
+            dt=dt, initial_covariance=initial_covariance
+        )
+        loglik[start:stop] = block.reshape(stop - start, n_series)
+
+    if per_session:
+        best = loglik.argmax(axis=0)
+        return q_grid[best], r_grid[best]
+
+    best = loglik.sum(axis=1).argmax()
+    return float(q_grid[best]), float(r_grid[best])
+
+
+def stack_series(series_list):
+    """
+    Empilha séries (n_amostras, 2) de tamanhos diferentes, completando com NaN.
+    """
+    n_steps = max((len(series) for series in series_list), default=0)
+    stacked = np.full((len(series_list), n_steps, 2), np.nan)
+    for i, series in enumerate(series_list):
+        stacked[i, :len(series)] = series
+    return stacked
+
+
+def has_raw_measurements(session):
+    return all(parse_series(session.get(col)) for col in RAW_COLUMNS)
+
+
+def session_measurements(sessions):
+    """
+    Extrai as séries (pitch, roll) dos dois sensores de cada sessão gravada.
+
+    Usa as medições sem filtro (colunas "Raw ..."). Sessões antigas, gravadas
+    antes dessas colunas existirem, só têm pitch/roll já filtrados; nesse caso
+    esses valores são usados no lugar (ver has_raw_measurements).
+    """
+    series_list = []
+    for session in sessions:
+        prefix = 'Raw ' if has_raw_measurements(session) else ''
+        for sensor in ('1', '2'):
+            pitch = parse_series(session[f'{prefix}Pitch {sensor}'])
+            roll = parse_series(session[f'{prefix}Roll {sensor}'])
+            n = min(len(pitch), len(roll))
+            series_list.append(np.column_stack([pitch[:n], roll[:n]]))
+    return stack_series(series_list)
+
+
+def angle_between(pitch1, roll1, pitch2, roll2):
+    """
+    Versão vetorizada de calculate_angle_between (display.py).
+    """
+    dot_product = pitch1 * pitch2 + roll1 * roll2
+    magnitude = np.hypot(pitch1, roll1) * np.hypot(pitch2, roll2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.degrees(np.arccos(np.clip(dot_product / magnitude, -1.0, 1.0)))
+
+
+def refilter_sessions(sessions, params=None):
+    """
+    Refiltra sessões gravadas com os parâmetros dados e recalcula o ângulo
+    entre os sensores. Retorna as sessões com as séries substituídas.
+    Parte das medições sem filtro; em sessões antigas, refiltra os valores já filtrados.
+    """
+    params = params or load_params()
+    sessions = list(sessions)
+    if not sessions:
+        return []
+
+    filtered, _ = filter_batch(
+        session_measurements(sessions), params['process_noise'], params['measurement_noise'],
+        dt=params['dt'], initial_covariance=params['initial_covariance'],
+        adaptive=params['adaptive'], forgetting_factor=params['forgetting_factor']
+    )
+
+    refiltered = []
+    for i, session in enumerate(sessions):
+        sensor1, sensor2 = filtered[2 * i], filtered[2 * i + 1]
+        n = min(np.count_nonzero(~np.isnan(sensor1[:, 0])), np.count_nonzero(~np.isnan(sensor2[:, 0])))
+        if n == 0:
+            # Sessão sem pitch/roll: mantém como está
+            refiltered.append(session)
+            continue
+        pitch1, roll1 = sensor1[:n, 0], sensor1[:n, 1]
+        pitch2, roll2 = sensor2[:n, 0], sensor2[:n, 1]
+        session = dict(session)
+        for col, values in (('Pitch 1', pitch1), ('Roll 1', roll1), ('Pitch 2', pitch2), ('Roll 2', roll2),
+                            ('Angle Between Sensors', angle_between(pitch1, roll1, pitch2, roll2))):
+            session[col] = ', '.join(map(str, values.tolist()))
+        refiltered.append(session)
+    return refiltered
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ajusta os ruídos do filtro de Kalman a partir das sessões gravadas.")
+    parser.add_argument('patients', nargs='+', help="Nomes dos pacientes (arquivos <nome>_sessions.csv)")
+    parser.add_argument('--output', default=PARAMS_FILE, help="Arquivo JSON onde os parâmetros são salvos")
+    parser.add_argument('--include-legacy', action='store_true',
+                        help="Usa também sessões antigas, que só têm pitch/roll já filtrados")
+    args = parser.parse_args()
+
+    sessions = [session for patient in args.patients for session in iter_sessions(patient)]
+    if not args.include_legacy:
+        # Ajustar sobre a saída do filtro antigo não estima o ruído do sensor
+        n_legacy = len(sessions)
+        sessions = [session for session in sessions if has_raw_measurements(session)]
+        n_legacy -= len(sessions)
+        if n_legacy:
+            print(f"{n_legacy} sessões sem medições brutas ignoradas (use --include-legacy para incluí-las)")
+    if not sessions:
+        parser.error("Nenhuma sessão encontrada para os pacientes informados.")
+
+    params = load_params(args.output)
+    params['process_noise'], params['measurement_noise'] = tune_noise(
+        session_measurements(sessions), dt=params['dt'], initial_covariance=params['initial_covariance']
+    )
+    save_params(params, args.output)
+    print(f"Q = {params['process_noise']:.4g}, R = {params['measurement_noise']:.4g} "
+          f"({len(sessions)} sessões) salvos em {args.output}")
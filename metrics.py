@@ -0,0 +1,137 @@
+import json
+import os
+
+from history import BASE_DIR, to_float, to_text
+
+# Arquivo com as regras de pré-processamento e de recorte das curvas
+RULES_FILE = os.path.join(BASE_DIR, 'preprocess_rules.json')
+
+# Regras padrão: nenhuma correção por paciente (elas ficam em preprocess_rules.json)
+DEFAULT_RULES = {
+    # Correções aplicadas às sessões cujos campos batem com "match"
+    'rules': [],
+    # Recorte da curva: início quando |ângulo| > threshold, recuando "lead"
+    # amostras, com no máximo "window" amostras
+    'trim': {'threshold': 1, 'lead': 10, 'window': 50}
+}
+
+# Transformações disponíveis para as regras
+ACTIONS = {
+    'invert_abs': lambda angles: [abs(-x) for x in angles],  # Inverte o sinal e usa o valor absoluto
+    'invert': lambda angles: [-x for x in angles],
+    'abs': lambda angles: [abs(x) for x in angles],
+}
+
+
+def load_rules(filename=None):
+    """
+    Lê as regras de pré-processamento, completando com os valores padrão.
+    Sem filename, usa preprocess_rules.json se existir. Um arquivo informado
+    que não existe, ou qualquer arquivo inválido, gera erro (nunca cai nas
+    regras padrão sem avisar).
+    """
+    if filename is None:
+        if not os.path.exists(RULES_FILE):
+            return {'rules': [], 'trim': dict(DEFAULT_RULES['trim'])}
+        filename = RULES_FILE
+
+    try:
+        with open(filename, encoding='utf-8') as file:
+            loaded = json.load(file)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Arquivo de regras não encontrado: {filename}")
+    except ValueError as e:
+        raise ValueError(f"Arquivo de regras inválido ({filename}): {e}")
+
+    if not isinstance(loaded, dict) or not isinstance(loaded.get('rules', []), list) \
+            or not isinstance(loaded.get('trim', {}), dict):
+        raise ValueError(f"Arquivo de regras inválido ({filename}): esperado {{'rules': [...], 'trim': {{...}}}}")
+
+    unknown_trim = set(loaded.get('trim', {})) - set(DEFAULT_RULES['trim'])
+    if unknown_trim:
+        raise ValueError(f"Parâmetros de recorte desconhecidos em {filename}: {sorted(unknown_trim)}")
+
+    rules = {'rules': loaded.get('rules', []), 'trim': dict(DEFAULT_RULES['trim'], **loaded.get('trim', {}))}
+    for rule in rules['rules']:
+        if not isinstance(rule, dict) or not isinstance(rule.get('match'), dict):
+            raise ValueError(f"Regra sem 'match' em {filename}: {rule}")
+        if rule.get('action') not in ACTIONS:
+            raise ValueError(f"Ação desconhecida na regra {rule}: {rule.get('action')}")
+    return rules
+
+
+def typed_value(column, value):
+    # Mesmos tipos usados na exportação: 'Valor Corrente' como número, o resto como texto
+    return to_float(value) if column == 'Valor Corrente' else to_text(value)
+
+
+def rule_matches(rule, session):
+    """
+    Compara os campos da regra com a sessão usando tipos fixos, para que o
+    resultado não dependa do tipo que o pandas inferiu ao ler o CSV.
+    """
+    return all(typed_value(column, session.get(column)) == typed_value(column, value)
+               for column, value in rule['match'].items())
+
+
+def apply_rules(session, angles, rules):
+    """
+    Aplica às séries de ângulo as regras cujos campos batem com a sessão.
+    """
+    for rule in rules['rules']:
+        if rule_matches(rule, session):
+            angles = ACTIONS[rule['action']](angles)
+    return angles
+
+
+def normalize_and_trim(data, threshold=1, lead=10, window=50):
+    """
+    Normaliza a curva para partir de zero e recorta o trecho do movimento.
+    """
+    if not data:
+        return []
+
+    # Converte para uma curva crescente, se necessário
+    if data[0] > data[-1]:  # Se for decrescente
+        data = [-x for x in data]  # Inverte os sinais
+
+    # Ajusta para partir do mesmo ponto
+    start_point = data[0]
+    normalized_data = [x - start_point for x in data]
+
+    # Encontra o ponto inicial e final relevantes
+    start_idx = max(0, next((i for i, val in enumerate(normalized_data) if abs(val) > threshold), 0) - lead)
+    end_idx = min(len(normalized_data), start_idx + window)  # Limita o tamanho após o início
+    return normalized_data[start_idx:end_idx]
+
+
+def calculate_angular_velocity(angles, times):
+    """
+    Calcula a velocidade angular positiva entre amostras consecutivas.
+    """
+    angular_velocity = []
+    for i in range(1, len(angles)):
+        delta_theta = angles[i] - angles[i - 1]  # Diferença de ângulo
+        delta_time = times[i] - times[i - 1]  # Diferença de tempo
+        if delta_time != 0:
+            velocity = abs(delta_theta / delta_time)  # Usa o valor absoluto
+            angular_velocity.append(velocity)
+        else:
+            angular_velocity.append(0)  # Evita divisão por zero
+    return angular_velocity
+
+
+def calculate_g7(max_with_current, max_without_current):
+    """
+    Métrica G7 a partir dos picos com e sem corrente.
+    Retorna uma mensagem de erro (str) quando não é possível calcular.
+    """
+    # Verifica se há dados suficientes para o cálculo
+    if max_with_current is None or max_without_current is None:
+        return "Erro: Dados insuficientes para calcular a Métrica G7."
+
+    # Verifica se o pico sem corrente é zero (evita divisão por zero)
+    if max_without_current == 0:
+        return "Erro: Pico máximo sem corrente é zero. Não é possível calcular a Métrica G7."
+
+    return ((max_with_current - max_without_current) / max_without_current) * 1
@@ -0,0 +1,172 @@
+import argparse
+import csv
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from history import (BASE_DIR, META_COLUMNS, iter_session_range, list_history_files, parse_series,
+                     split_session_file, to_float, to_text)
+from kalman import PARAMS_FILE, load_params, refilter_sessions
+from metrics import (RULES_FILE, apply_rules, calculate_angular_velocity, calculate_g7, load_rules,
+                     normalize_and_trim)
+
+OUTPUT_DIR = os.path.join(BASE_DIR, 'summaries')
+
+# Tamanho (bytes) do trecho de arquivo lido e processado por tarefa
+CHUNK_BYTES = 1024 * 1024
+
+SESSION_SUMMARY_COLUMNS = ['Paciente'] + META_COLUMNS + [
+    'Amostras', 'Pico Recortado', 'Velocidade Máxima', 'Velocidade Média', 'Trimmed Angle', 'Angular Velocity'
+]
+G7_SUMMARY_COLUMNS = ['Paciente', 'Articulação', 'Pico Com Corrente', 'Pico Sem Corrente', 'Métrica G7']
+
+
+def process_sessions(patient_name, sessions, rules, kalman_params=None):
+    """
+    Recalcula as métricas derivadas de um bloco de sessões.
+    """
+    if kalman_params is not None:
+        sessions = refilter_sessions(sessions, kalman_params)
+
+    results = []
+    for session in sessions:
+        # Tipos fixos antes das regras: o pandas infere o tipo de cada trecho separadamente
+        meta = {col: to_text(session[col]) for col in META_COLUMNS[:-1]}
+        meta['Valor Corrente'] = to_float(session['Valor Corrente'])
+
+        angles = apply_rules(meta, parse_series(session['Angle Between Sensors']), rules)
+        trimmed = normalize_and_trim(angles, **rules['trim'])
+        velocity = calculate_angular_velocity(angles, list(range(len(angles))))
+
+        result = {'Paciente': patient_name}
+        result.update(meta)
+        result.update({
+            'Amostras': len(angles),
+            'Pico Recortado': max(trimmed) if trimmed else None,
+            'Velocidade Máxima': max(velocity) if velocity else None,
+            'Velocidade Média': sum(velocity) / len(velocity) if velocity else None,
+            'Trimmed Angle': ', '.join(map(str, trimmed)),
+            'Angular Velocity': ', '.join(map(str, velocity)),
+        })
+        results.append(result)
+    return results
+
+
+def process_range(patient_name, filename, start, end, rules, kalman_params=None):
+    """
+    Lê e processa um trecho do arquivo de sessões (roda nos processos do pool).
+    """
+    return process_sessions(patient_name, list(iter_session_range(filename, start, end)), rules, kalman_params)
+
+
+def iter_work(files, chunk_bytes):
+    # Trechos de todos os arquivos: o processo principal só divide por tamanho, sem ler os dados
+    for patient_name, filename in files:
+        for start, end in split_session_file(filename, chunk_bytes):
+            yield patient_name, filename, start, end
+
+
+def update_g7_peaks(peaks, result):
+    """
+    Acumula os picos com e sem corrente por paciente e articulação (mesma regra do dashboard).
+    """
+    if result['Pico Recortado'] is None:
+        return
+    key = (result['Paciente'], result['Articulação'])
+    max_with_current, max_without_current = peaks.get(key, (None, None))
+    if result['Condition'] == 'Corrente':
+        max_with_current = max(max_with_current or 0, result['Pico Recortado'])
+    elif result['Condition'] == 'Sem Corrente':
+        max_without_current = max(max_without_current or 0, result['Pico Recortado'])
+    peaks[key] = (max_with_current, max_without_current)
+
+
+def write_g7_summary(path, peaks):
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(G7_SUMMARY_COLUMNS)
+        for (patient_name, joint), (max_with_current, max_without_current) in sorted(peaks.items()):
+            metric_g7 = calculate_g7(max_with_current, max_without_current)
+            writer.writerow([
+                patient_name, joint, max_with_current, max_without_current,
+                None if isinstance(metric_g7, str) else metric_g7  # Mensagem de erro -> vazio
+            ])
+
+
+def reprocess(data_dir=BASE_DIR, output_dir=OUTPUT_DIR, rules=None, kalman_params=None,
+              workers=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Recalcula as métricas de todas as sessões de data_dir em paralelo e salva
+    os resumos em output_dir. Retorna o número de sessões processadas.
+    """
+    rules = rules or load_rules()
+    workers = workers or os.cpu_count() or 1
+    files = list_history_files(data_dir)
+    print(f"{len(files)} arquivos de sessões encontrados em {data_dir}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    sessions_path = os.path.join(output_dir, 'sessions_summary.csv')
+    g7_path = os.path.join(output_dir, 'g7_summary.csv')
+
+    peaks = {}
+    n_sessions = 0
+    start = time.time()
+
+    with open(sessions_path, mode='w', newline='', encoding='utf-8') as file, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.DictWriter(file, fieldnames=SESSION_SUMMARY_COLUMNS)
+        writer.writeheader()
+
+        def collect(future):
+            nonlocal n_sessions
+            results = future.result()
+            writer.writerows(results)
+            for result in results:
+                update_g7_peaks(peaks, result)
+            n_sessions += len(results)
+            elapsed = time.time() - start
+            print(f"{n_sessions} sessões processadas ({n_sessions / max(elapsed, 1e-9):.0f} sessões/s)", flush=True)
+
+        # Limita as tarefas pendentes para não acumular resultados na memória
+        pending = deque()
+        for patient_name, filename, range_start, range_end in iter_work(files, chunk_bytes):
+            pending.append(pool.submit(process_range, patient_name, filename, range_start, range_end,
+                                       rules, kalman_params))
+            if len(pending) >= 2 * workers:
+                collect(pending.popleft())
+        while pending:
+            collect(pending.popleft())
+
+    write_g7_summary(g7_path, peaks)
+    print(f"Resumos salvos em {sessions_path} e {g7_path} ({time.time() - start:.1f} s)")
+    return n_sessions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Recalcula curvas recortadas, velocidades e Métrica G7 de todas as sessões gravadas."
+    )
+    parser.add_argument('--data-dir', default=BASE_DIR, help="Pasta com os arquivos *_sessions.csv")
+    parser.add_argument('--output', default=OUTPUT_DIR, help="Pasta onde os resumos são salvos")
+    parser.add_argument('--rules', default=None,
+                        help=f"Arquivo JSON com as regras de pré-processamento (padrão: {os.path.basename(RULES_FILE)})")
+    parser.add_argument('--workers', type=int, default=None, help="Número de processos (padrão: todos os núcleos)")
+    parser.add_argument('--chunk-bytes', type=int, default=CHUNK_BYTES, help="Bytes de arquivo por tarefa")
+    parser.add_argument('--refilter', action='store_true',
+                        help=f"Refiltra pitch/roll com o filtro de Kalman ({os.path.basename(PARAMS_FILE)}) antes")
+    args = parser.parse_args()
+
+    try:
+        rules = load_rules(args.rules)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    reprocess(
+        data_dir=args.data_dir,
+        output_dir=args.output,
+        rules=rules,
+        kalman_params=load_params() if args.refilter else None,
+        workers=args.workers,
+        chunk_bytes=args.chunk_bytes
+    )
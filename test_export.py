@@ -0,0 +1,77 @@
+import csv
+
+import pytest
+from openpyxl import load_workbook
+
+import export
+from conftest import make_session
+
+
+@pytest.fixture
+def sessions(patient_history):
+    patient_history([
+        make_session(0, n_samples=5),
+        make_session(1, n_samples=3, condition='Corrente', current_value=23),
+    ])
+
+
+def test_csv_round_trip(sessions, tmp_path):
+    path = export.export_sessions(['teste'], 'csv', tmp_path / 'out.csv')
+    with open(path, newline='', encoding='utf-8') as file:
+        rows = list(csv.reader(file))
+
+    assert rows[0] == export.EXPORT_COLUMNS
+    assert len(rows) == 1 + 5 + 3
+    assert rows[6][:6] == ['teste', '2024-12-05 14:00:01', 'Corrente', 'Cotovelo', '23.0', '0']
+    assert float(rows[6][-1]) == 1.0
+
+
+def test_excel_round_trip(sessions, tmp_path):
+    path = export.export_sessions(['teste'], 'xlsx', tmp_path / 'out.xlsx')
+    rows = list(load_workbook(path, read_only=True).active.iter_rows(values_only=True))
+
+    assert list(rows[0]) == export.EXPORT_COLUMNS
+    assert len(rows) == 1 + 5 + 3
+    assert rows[1][4] is None  # Sem corrente
+    assert rows[6][4] == 23.0
+
+
+def test_parquet_round_trip(sessions, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = export.export_sessions(['teste'], 'parquet', tmp_path / 'out.parquet')
+    table = pq.read_table(path)
+
+    assert table.column_names == export.EXPORT_COLUMNS
+    assert table.num_rows == 5 + 3
+    assert table.column('Valor Corrente').to_pylist() == [None] * 5 + [23.0] * 3
+
+
+def test_parquet_casts_unexpected_types(patient_history, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    # Nome numérico e texto em "Valor Corrente" não devem quebrar o schema
+    patient_history([make_session(0, n_samples=2, patient_name=123, current_value='abc')])
+    path = export.export_sessions(['teste'], 'parquet', tmp_path / 'out.parquet')
+
+    table = pq.read_table(path)
+    assert table.column('Patient Name').to_pylist() == ['123', '123']
+    assert table.column('Valor Corrente').to_pylist() == [None, None]
+
+
+def test_session_selection(sessions, tmp_path):
+    path = export.export_sessions(['teste'], 'csv', tmp_path / 'out.csv', ['2024-12-05 14:00:01'])
+    with open(path, newline='', encoding='utf-8') as file:
+        assert len(list(csv.reader(file))) == 1 + 3
+
+
+def test_cleanup_removes_expired_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, 'EXPORT_DIR', str(tmp_path))
+    old_file = tmp_path / 'old.csv'
+    old_file.write_text('x')
+    monkeypatch.setitem(export.export_jobs, 'old', {'status': 'done', 'path': str(old_file), 'finished': 0})
+    monkeypatch.setitem(export.export_jobs, 'running', {'status': 'running', 'path': 'x', 'finished': None})
+
+    export.cleanup_export_jobs(ttl=60)
+
+    assert 'old' not in export.export_jobs
+    assert 'running' in export.export_jobs
+    assert not old_file.exists()
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+import history
+from conftest import make_session
+
+
+def page_payload(page_size=10):
+    rows, _ = history.page_session_summaries('teste', 0, page_size)
+    return rows, len(json.dumps(rows))
+
+
+@pytest.mark.parametrize('n_samples', [20, 2000])
+def test_page_payload_does_not_grow_with_history(patient_history, n_samples):
+    n_sessions = 20
+    patient_history([make_session(i, n_samples) for i in range(n_sessions)])
+    rows, small = page_payload()
+
+    patient_history([make_session(i, n_samples) for i in range(10 * n_sessions)])
+    _, large = page_payload()
+
+    assert small == large
+    for row in rows:
+        assert not set(history.SERIES_COLUMNS) & set(row)
+
+
+def test_page_count_and_last_page(patient_history):
+    patient_history([make_session(i) for i in range(25)])
+    rows, page_count = history.page_session_summaries('teste', 2, 10)
+    assert page_count == 3
+    assert len(rows) == 5
+
+
+@pytest.mark.parametrize('filter_part, expected', [
+    ('{Condition} eq "Corrente"', ('Condition', 'eq', 'Corrente')),
+    ("{Articulação} contains 'Pun'", ('Articulação', 'contains', 'Pun')),
+    ('{Amostras} >= 20', ('Amostras', 'ge', 20.0)),
+    ('{Valor Corrente} ne 23', ('Valor Corrente', 'ne', 23.0)),
+    ('{Session Time} datestartswith 2024-12', ('Session Time', 'datestartswith', '2024-12')),
+    ('sem operador', (None, None, None)),
+])
+def test_split_filter_part(filter_part, expected):
+    assert history.split_filter_part(filter_part) == expected
+
+
+SUMMARIES = [
+    {'Condition': 'Corrente', 'Articulação': 'Punho', 'Valor Corrente': 23.0, 'Amostras': 50,
+     'Session Time': '2024-12-05 14:52:22'},
+    {'Condition': 'Sem Corrente', 'Articulação': 'Cotovelo', 'Valor Corrente': None, 'Amostras': 10,
+     'Session Time': '2025-01-10 09:00:00'},
+    {'Condition': 'Corrente', 'Articulação': 'Cotovelo', 'Valor Corrente': 20.0, 'Amostras': 30,
+     'Session Time': '2025-01-11 10:00:00'},
+]
+
+
+@pytest.mark.parametrize('filter_query, expected_samples', [
+    ('', [50, 10, 30]),
+    ('{Condition} eq "Corrente"', [50, 30]),
+    ('{Condition} eq Corrente && {Articulação} eq Cotovelo', [30]),
+    ('{Valor Corrente} ge 21', [50]),
+    ('{Valor Corrente} eq 23', [50]),
+    ('{Amostras} < 40', [10, 30]),
+    ('{Articulação} contains ovelo', [10, 30]),
+    ('{Session Time} datestartswith 2025', [10, 30]),
+])
+def test_filter_summaries(filter_query, expected_samples):
+    result = history.filter_summaries(SUMMARIES, filter_query)
+    assert [summary['Amostras'] for summary in result] == expected_samples
+
+
+def test_sort_summaries_keeps_missing_values_last():
+    result = history.sort_summaries(SUMMARIES, [{'column_id': 'Valor Corrente', 'direction': 'desc'}])
+    assert [summary['Valor Corrente'] for summary in result] == [23.0, 20.0, None]
+
+
+def test_reads_legacy_and_raw_rows_in_same_file(patient_history):
+    new_row = make_session(1, n_samples=3) + ['1.0, 2.0, 3.0'] * len(history.RAW_COLUMNS)
+    patient_history([make_session(0, n_samples=3), new_row])
+    legacy, new = history.iter_sessions('teste')
+
+    assert all(history.parse_series(legacy[col]) == [] for col in history.RAW_COLUMNS)
+    assert all(history.parse_series(new[col]) == [1.0, 2.0, 3.0] for col in history.RAW_COLUMNS)
+
+
+def test_missing_values_become_none_and_sort_last(patient_history):
+    sessions = [make_session(0), make_session(1, condition='Corrente', current_value=23)]
+    sessions[0][2] = ''  # Condition vazia
+    patient_history(sessions)
+
+    summaries = history.load_session_summaries('teste')
+    assert summaries[0]['Condition'] is None
+    assert summaries[0]['Valor Corrente'] is None
+
+    for column in ('Condition', 'Valor Corrente'):
+        result = history.sort_summaries(summaries, [{'column_id': column, 'direction': 'asc'}])
+        assert result[-1][column] is None
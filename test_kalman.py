@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+import history
+import kalman
+from conftest import make_session
+
+
+def run_sequential(series, **params):
+    kf = kalman.AngleKalmanFilter(**params)
+    filtered = []
+    for z in series:
+        kf.predict()
+        kf.update(z)
+        filtered.append(kf.x[:2].copy())
+    return np.array(filtered)
+
+
+@pytest.mark.parametrize('process_noise, measurement_noise, adaptive', [
+    (1.0, 0.1, False),
+    (0.01, 5.0, False),
+    (1.0, 0.1, True),
+    (0.01, 5.0, True),
+])
+def test_batch_matches_sequential_filter(process_noise, measurement_noise, adaptive):
+    rng = np.random.default_rng(0)
+    t = np.arange(80)
+    series = [
+        np.column_stack([40 * np.sin(t / 10), 170 + 20 * np.cos(t / 7)]) + rng.normal(0, 1, (80, 2)),
+        np.column_stack([t * 1.5, -t * 0.5]) + rng.normal(0, 1, (80, 2)),
+    ]
+    series[1] = series[1][:55]  # Séries de tamanhos diferentes (completadas com NaN)
+
+    batch, loglik = kalman.filter_batch(kalman.stack_series(series), process_noise, measurement_noise,
+                                        adaptive=adaptive, forgetting_factor=0.9)
+
+    for i, values in enumerate(series):
+        expected = run_sequential(values, process_noise=process_noise, measurement_noise=measurement_noise,
+                                  adaptive=adaptive, forgetting_factor=0.9)
+        np.testing.assert_allclose(batch[i, :len(values)], expected, atol=1e-9)
+        assert np.isnan(batch[i, len(values):]).all()
+    assert np.isfinite(loglik).all()
+
+
+def test_roll_wraparound_innovation_is_small():
+    kf = kalman.AngleKalmanFilter()
+    for _ in range(10):
+        kf.predict()
+        kf.update([10.0, 179.0])
+
+    kf.predict()
+    kf.update([10.0, -179.0])
+
+    assert kf.y[1] == pytest.approx(2.0, abs=0.1)
+    # O filtro continua perto de ±180° em vez de "atravessar" 0°
+    assert abs(kalman.wrap_angle(kf.x[1] - 180.0)) < 2.0
+
+
+def test_batch_roll_wraparound():
+    series = np.array([[[10.0, 179.0]] * 10 + [[10.0, -179.0]] * 5])
+    filtered, _ = kalman.filter_batch(series, 1.0, 0.1)
+    assert (np.abs(kalman.wrap_angle(filtered[0, :, 1] - 180.0)) < 2.0).all()
+
+
+def test_session_measurements_prefers_raw_columns():
+    legacy = dict(zip(history.SESSION_COLUMNS, make_session(0, n_samples=4)))
+    raw = dict(legacy)
+    for col in history.RAW_COLUMNS:
+        raw[col] = '1.0, 2.0, 3.0'
+
+    assert not kalman.has_raw_measurements(legacy)
+    assert kalman.has_raw_measurements(raw)
+    np.testing.assert_array_equal(kalman.session_measurements([raw])[0, :, 0], [1.0, 2.0, 3.0])
+    # Sessões antigas usam pitch/roll gravados (já filtrados)
+    np.testing.assert_array_equal(kalman.session_measurements([legacy])[0, :, 0], [0.0, 1.0, 2.0, 3.0])
+
+
+def test_tune_noise_recovers_measurement_noise():
+    rng = np.random.default_rng(1)
+    t = np.arange(200)
+    truth = np.column_stack([30 * np.sin(t / 15), 60 * np.cos(t / 20)])
+    measurements = np.stack([truth + rng.normal(0, 2.0, truth.shape) for _ in range(4)])
+
+    _, measurement_noise = kalman.tune_noise(measurements)
+    # Variância verdadeira = 4; a grade é logarítmica (passo de ~1.8x)
+    assert 2.0 <= measurement_noise <= 8.0
+
+
+def test_filter_batch_with_only_empty_series():
+    filtered, loglik = kalman.filter_batch(np.empty((3, 0, 2)), 1.0, 0.1)
+    assert filtered.shape == (3, 0, 2)
+    np.testing.assert_array_equal(loglik, np.zeros(3))
+
+
+def test_refilter_keeps_empty_sessions():
+    empty = dict(zip(history.SESSION_COLUMNS, make_session(0, n_samples=0)))
+    session = dict(zip(history.SESSION_COLUMNS, make_session(1, n_samples=5)))
+
+    assert kalman.refilter_sessions([empty], dict(kalman.DEFAULT_PARAMS)) == [empty]
+
+    refiltered = kalman.refilter_sessions([empty, session], dict(kalman.DEFAULT_PARAMS, adaptive=True))
+    assert refiltered[0] == empty
+    assert len(history.parse_series(refiltered[1]['Pitch 1'])) == 5
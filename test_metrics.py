@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+import metrics
+
+PERSO_RULE = {
+    'match': {'Patient Name': 'Perso', 'Articulação': 'Punho', 'Condition': 'Corrente', 'Valor Corrente': 23},
+    'action': 'invert_abs'
+}
+
+
+def write_rules(tmp_path, content):
+    path = tmp_path / 'rules.json'
+    path.write_text(content if isinstance(content, str) else json.dumps(content), encoding='utf-8')
+    return str(path)
+
+
+def test_load_rules_from_file(tmp_path):
+    rules = metrics.load_rules(write_rules(tmp_path, {'rules': [PERSO_RULE], 'trim': {'window': 5}}))
+    assert rules['rules'] == [PERSO_RULE]
+    assert rules['trim'] == {'threshold': 1, 'lead': 10, 'window': 5}
+
+
+def test_default_rules_have_no_patient_specific_fix():
+    assert metrics.DEFAULT_RULES['rules'] == []
+
+
+def test_unknown_action_is_rejected(tmp_path):
+    path = write_rules(tmp_path, {'rules': [dict(PERSO_RULE, action='espelhar')]})
+    with pytest.raises(ValueError, match='espelhar'):
+        metrics.load_rules(path)
+
+
+@pytest.mark.parametrize('content', ['{"rules": [', '[]', '{"rules": {}}', '{"trim": {"janela": 5}}',
+                                     '{"rules": [{"action": "abs"}]}'])
+def test_malformed_rules_file_is_rejected(tmp_path, content):
+    with pytest.raises(ValueError):
+        metrics.load_rules(write_rules(tmp_path, content))
+
+
+def test_missing_rules_file_is_rejected(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        metrics.load_rules(str(tmp_path / 'nao_existe.json'))
+
+
+@pytest.mark.parametrize('current_value, expected', [
+    (23, True), (23.0, True), ('23', True), ('23.0', True), ('abc', False), (None, False), (20, False),
+])
+def test_rule_matches_with_fixed_types(current_value, expected):
+    session = {'Patient Name': 'Perso', 'Articulação': 'Punho', 'Condition': 'Corrente',
+               'Valor Corrente': current_value}
+    assert metrics.rule_matches(PERSO_RULE, session) is expected
+
+
+def test_apply_rules():
+    rules = {'rules': [PERSO_RULE], 'trim': metrics.DEFAULT_RULES['trim']}
+    session = {'Patient Name': 'Perso', 'Articulação': 'Punho', 'Condition': 'Corrente', 'Valor Corrente': 23.0}
+    assert metrics.apply_rules(session, [-1.0, 2.0], rules) == [1.0, 2.0]
+    assert metrics.apply_rules(dict(session, Condition='Sem Corrente'), [-1.0, 2.0], rules) == [-1.0, 2.0]
+
+
+def test_trim_parameters_change_output():
+    data = [0.0] * 30 + [float(i) for i in range(1, 81)]
+
+    default = metrics.normalize_and_trim(data, **metrics.DEFAULT_RULES['trim'])
+    assert len(default) == 50
+    assert default[0] == 0.0 and default[10] == 2.0  # 10 amostras antes de |ângulo| > 1
+
+    assert len(metrics.normalize_and_trim(data, threshold=1, lead=10, window=20)) == 20
+    assert metrics.normalize_and_trim(data, threshold=1, lead=0, window=50)[0] == 2.0
+    assert metrics.normalize_and_trim(data, threshold=40, lead=0, window=50)[0] == 41.0
@@ -0,0 +1,100 @@
+import csv
+import json
+
+import pytest
+
+import history
+import metrics
+import reprocess
+from conftest import make_session
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    sessions = [make_session(i, n_samples=30 + i, condition='Corrente' if i % 2 else 'Sem Corrente',
+                             current_value=20 if i % 2 else None) for i in range(40)]
+    for patient_name in ('ana', 'bia'):
+        with open(tmp_path / f'{patient_name}_sessions.csv', mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(history.SESSION_COLUMNS)
+            writer.writerows(sessions)
+    return tmp_path
+
+
+@pytest.mark.parametrize('chunk_bytes', [1, 500, 4096, 10 ** 9])
+def test_ranges_cover_every_session_once(data_dir, chunk_bytes):
+    filename = str(data_dir / 'ana_sessions.csv')
+    times = [session['Session Time']
+             for start, end in history.split_session_file(filename, chunk_bytes)
+             for session in history.iter_session_range(filename, start, end)]
+
+    expected = [session['Session Time'] for session in history.iter_session_file(filename)]
+    assert times == expected
+    assert len(times) == 40
+
+
+def read_csv_rows(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        return list(csv.reader(file))
+
+
+def test_parallel_matches_single_process(data_dir, tmp_path):
+    single = reprocess.reprocess(data_dir, tmp_path / 'single', workers=1, chunk_bytes=10 ** 9)
+    parallel = reprocess.reprocess(data_dir, tmp_path / 'parallel', workers=2, chunk_bytes=2000)
+
+    assert single == parallel == 80
+    for name in ('sessions_summary.csv', 'g7_summary.csv'):
+        assert read_csv_rows(tmp_path / 'single' / name) == read_csv_rows(tmp_path / 'parallel' / name)
+
+    g7 = read_csv_rows(tmp_path / 'single' / 'g7_summary.csv')
+    assert [row[:2] for row in g7[1:]] == [['ana', 'Cotovelo'], ['bia', 'Cotovelo']]
+
+
+def perso_session(index, current_value):
+    series = ', '.join(str(float(x)) for x in range(-10, 20))
+    return ['Perso', f'2024-12-05 15:00:{index:02d}', 'Corrente', 'Punho', current_value] + [series] * 5
+
+
+@pytest.fixture
+def perso_dir(tmp_path):
+    data = tmp_path / 'data'
+    data.mkdir()
+    with open(data / 'Perso_sessions.csv', mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(history.SESSION_COLUMNS)
+        writer.writerows([perso_session(0, 23), perso_session(1, 23), perso_session(2, 20),
+                          perso_session(3, 'abc')])
+
+    rules_file = tmp_path / 'rules.json'
+    rules_file.write_text(json.dumps({'rules': [{
+        'match': {'Patient Name': 'Perso', 'Articulação': 'Punho', 'Condition': 'Corrente', 'Valor Corrente': 23},
+        'action': 'invert_abs'
+    }]}), encoding='utf-8')
+    return data, metrics.load_rules(str(rules_file))
+
+
+@pytest.mark.parametrize('chunk_bytes', [200, 1000, 10 ** 9])
+def test_rules_from_file_are_applied_for_any_range_size(perso_dir, tmp_path, chunk_bytes):
+    data, rules = perso_dir
+    reprocess.reprocess(data, tmp_path / 'out', rules=rules, workers=1, chunk_bytes=chunk_bytes)
+    rows = read_csv_rows(tmp_path / 'out' / 'sessions_summary.csv')
+    peak = rows[0].index('Pico Recortado')
+
+    # Com a regra (|ângulo|) o pico recortado é 9; sem ela, a rampa vai até 29
+    assert [float(row[peak]) for row in rows[1:]] == [9.0, 9.0, 29.0, 29.0]
+
+
+def test_without_rules_file_no_correction_is_applied(perso_dir, tmp_path):
+    data, _ = perso_dir
+    reprocess.reprocess(data, tmp_path / 'out', rules=dict(metrics.DEFAULT_RULES), workers=1)
+    rows = read_csv_rows(tmp_path / 'out' / 'sessions_summary.csv')
+    peak = rows[0].index('Pico Recortado')
+    assert [float(row[peak]) for row in rows[1:]] == [29.0] * 4
+
+
+def test_trim_window_from_rules_is_used(data_dir, tmp_path):
+    rules = dict(metrics.DEFAULT_RULES, trim={'threshold': 1, 'lead': 10, 'window': 5})
+    reprocess.reprocess(data_dir, tmp_path / 'out', rules=rules, workers=1)
+    rows = read_csv_rows(tmp_path / 'out' / 'sessions_summary.csv')
+    trimmed = rows[0].index('Trimmed Angle')
+    assert all(len(history.parse_series(row[trimmed])) == 5 for row in rows[1:])